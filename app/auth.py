@@ -1,16 +1,28 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from .database import get_session
 from .schemas import UserCreate
 from .models import User
-from .security import hash_password
+from .security import hash_password, ahash_password, averify_password
 from fastapi.security import OAuth2PasswordRequestForm
-from .security import verify_password, create_access_token
+from .security import create_access_token, password_needs_rehash, invalidate_cached_user
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 # Initialize limiter for auth routes
-limiter = Limiter(key_func=get_remote_address)
+# Set RATE_LIMIT_STORAGE_URI (e.g. redis://localhost:6379/0) to share counters across workers
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI", "memory://"),
+    strategy="moving-window",
+)
+
+# Hash checked against when the username does not exist, so a missing user
+# costs the same hashing work as a wrong password (no timing-based enumeration)
+_DUMMY_HASH = hash_password("dummy-password-for-timing")
 
 # Create a router for authentication
 router = APIRouter(
@@ -20,42 +32,36 @@ router = APIRouter(
 
 @router.post("/register/")
 @limiter.limit("3/minute")
-def register_user(request: Request, user_input: UserCreate, session: Session = Depends(get_session)):
+async def register_user(request: Request, user_input: UserCreate, session: AsyncSession = Depends(get_session)):
     """
     Handles new user registration using a Schema (UserCreate).
     """
     
-    # Convert username to lowercase for case-insensitive authentication
-    username_lower = user_input.username.lower()
-    
-    # 1. Check if the username already exists (case-insensitive)
-    statement_username = select(User).where(User.username == username_lower)
-    if session.exec(statement_username).first():
-        raise HTTPException(
-            status_code=400, 
-            detail="This username is already taken. Please choose another."
-        )
-
-    # 2. Check if the email already exists
-    statement_email = select(User).where(User.email == user_input.email)
-    if session.exec(statement_email).first():
-        raise HTTPException(
-            status_code=400, 
-            detail="This email address is already registered."
-        )
-
-    # 2. Convert input data into the database model (User)
+    # 1. Convert input data into the database model (User)
     # The plain password from user_input is hashed before saving for security
-    # Username is stored in lowercase
+    # Username keeps its original case; uniqueness is checked on the casefolded key
     new_user = User(
-        username=username_lower,
+        username=user_input.username,
+        username_key=user_input.username.casefold(),
         email=user_input.email,
-        hashed_password=hash_password(user_input.password) 
+        hashed_password=await ahash_password(user_input.password)
     )
     
+    # 2. Let the unique constraints on username/email reject duplicates
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    try:
+        await session.commit()
+    except IntegrityError as exc:
+        await session.rollback()
+        if "username" in str(exc.orig):
+            raise HTTPException(
+                status_code=400, 
+                detail="This username is already taken. Please choose another."
+            )
+        raise HTTPException(
+            status_code=400, 
+            detail="This email address is already registered."
+        )
     
     return {
         "message": "User registered successfully", 
@@ -68,26 +74,35 @@ def register_user(request: Request, user_input: UserCreate, session: Session = D
 async def login_for_access_token(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     """
     Verifies user credentials and returns a JWT access token.
     """
-    # 1. Look for the user in the database (case-insensitive)
-    # Convert username to lowercase to match stored format
-    username_lower = form_data.username.lower()
-    user = session.exec(select(User).where(User.username == username_lower)).first()
+    # 1. Look for the user in the database (case-insensitive via the casefolded key)
+    statement = select(User).where(User.username_key == form_data.username.casefold())
+    user = (await session.exec(statement)).first()
     
-    # 2. Verify password
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # 2. Verify password (always run the hash check, even for unknown users)
+    password_ok = await averify_password(
+        form_data.password, user.hashed_password if user else _DUMMY_HASH
+    )
+    if not user or not password_ok:
         raise HTTPException(
             status_code=401, 
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Upgrade legacy bcrypt hashes (or outdated Argon2 parameters)
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await ahash_password(form_data.password)
+        session.add(user)
+        await session.commit()
+        invalidate_cached_user(user.id)
+
     # 3. Create JWT Token
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data={"sub": str(user.id), "uname": user.username})
     
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -1,5 +1,8 @@
-from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 from fastapi import Depends
+from sqlalchemy import event, inspect
 import os
 
 # Get the base directory (project root)
@@ -16,18 +19,76 @@ else:
     import tempfile
     sqlite_url = f"sqlite:///{os.path.join(tempfile.gettempdir(), sqlite_file_name)}"
 
-# The engine is the "bridge" that handles the communication between Python and SQLite
-# check_same_thread: False is required for SQLite to work with FastAPI's asynchronous nature
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+# The app is SQLite-only: the pragmas, the startup migration and the SQL it
+# runs are written for SQLite, and no other async driver is installed
+if not sqlite_url.startswith("sqlite"):
+    raise RuntimeError(f"Unsupported DATABASE_URL {sqlite_url!r}: only sqlite:/// URLs are supported.")
 
-# Function to physically create the database file and all defined tables
-def create_db_and_tables():
+# Switch to the async SQLite driver
+async_url = sqlite_url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+
+# The engine is the "bridge" that handles the communication between Python and the database
+# check_same_thread: False is required because aiosqlite runs SQLite calls in its own thread
+engine = create_async_engine(
+    async_url,
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+)
+
+# Tune every new SQLite connection: WAL lets readers run while a write is in
+# progress, and the cache/mmap settings keep hot pages in memory
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
+
+event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+def _migrate_username_key(connection):
+    """Adds and backfills user.username_key on databases created before it existed."""
+    columns = {column["name"] for column in inspect(connection).get_columns("user")}
+    if "username_key" not in columns:
+        connection.exec_driver_sql('ALTER TABLE "user" ADD COLUMN username_key VARCHAR')
+    # Replaced by username_key, which also folds non-ASCII letters
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_user_username_nocase")
+
+    taken = {key for (key,) in connection.exec_driver_sql(
+        'SELECT username_key FROM "user" WHERE username_key IS NOT NULL'
+    )}
+    rows = connection.exec_driver_sql(
+        'SELECT id, username FROM "user" WHERE username_key IS NULL ORDER BY id'
+    ).fetchall()
+    for user_id, username in rows:
+        key = username.casefold()
+        if key in taken:
+            # Two accounts fold to the same name; the older one keeps it
+            print(f"WARNING: username '{username}' (id {user_id}) clashes with another account; it cannot log in until renamed.")
+            continue
+        taken.add(key)
+        connection.exec_driver_sql('UPDATE "user" SET username_key = ? WHERE id = ?', (key, user_id))
+
+def _create_all(connection):
     # Looks at all classes that inherit from SQLModel and creates them in the database
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(connection)
+    _migrate_username_key(connection)
+    # create_all skips tables that already exist, so add any new indexes separately
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+# Function to physically create the database file and all defined tables
+async def create_db_and_tables():
+    async with engine.begin() as connection:
+        await connection.run_sync(_create_all)
 
 # Dependency function to manage database sessions for each request
-def get_session():
-    # Using 'with' ensures the session is automatically closed after the task is done
-    with Session(engine) as session:
+async def get_session():
+    # expire_on_commit=False keeps loaded attributes usable after commit,
+    # since lazy refreshes are not possible on an async session
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         # 'yield' provides the session to the FastAPI endpoint and pauses until the request finishes
-        yield session
\ No newline at end of file
+        yield session
@@ -1,22 +1,23 @@
 import os
+import hashlib
 from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, Response
 from pydantic import ValidationError
-from sqlmodel import Session, select
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 from contextlib import asynccontextmanager
 from datetime import datetime
 
 # Imports for handling frontend static files
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 
 # Custom file imports
 from .database import engine, create_db_and_tables, get_session
 from .models import Task, User
 from .auth import router as auth_router
 from .routers import users as users_router
-from .schemas import TaskCreate, TaskRead, TaskUpdate
+from .schemas import TaskCreate, TaskRead, TaskUpdate, TASK_READ_ADAPTER, TASK_LIST_ADAPTER, dump_json, build_schemas
 from .security import get_current_user
 
 # Rate Limiting
@@ -31,14 +32,38 @@ STATIC_DIR = os.path.join(BASE_DIR, "static")
 
 @asynccontextmanager 
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    await create_db_and_tables()
+    # Build the deferred pydantic validators now so the first request does not pay for it
+    build_schemas()
+    # Read index.html once so "/" is served from memory
+    index_path = os.path.join(STATIC_DIR, "index.html")
+    if os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            app.state.index_bytes = f.read()
+        app.state.index_etag = '"' + hashlib.sha256(app.state.index_bytes).hexdigest() + '"'
+    else:
+        print(f"WARNING: {index_path} not found. The root page will return an error.")
+        app.state.index_bytes = None
     yield
     print("Cleaning up resources...")
+    # Close pooled database connections instead of leaving them to the garbage collector
+    await engine.dispose()
+
+# orjson encodes responses in native code instead of the stdlib json module.
+# Newer FastAPI serializes through pydantic itself and deprecates ORJSONResponse,
+# so it is only used on versions where it is still the faster path.
+DefaultJSONResponse = JSONResponse if getattr(ORJSONResponse, "__deprecated__", None) else ORJSONResponse
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultJSONResponse)
 
 # Initialize Rate Limiter
-limiter = Limiter(key_func=get_remote_address, default_limits=["100/minute"])
+# Counters live in RATE_LIMIT_STORAGE_URI (e.g. Redis) when set, so all workers share them
+limiter = Limiter(
+    key_func=get_remote_address,
+    default_limits=["100/minute"],
+    storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI", "memory://"),
+    strategy="moving-window",
+)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
@@ -55,15 +80,34 @@ app.add_middleware(
 )
 
 # Security Headers Middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; font-src 'self' https://fonts.gstatic.com; img-src 'self' data: https://ui-avatars.com"
-    return response
+# Headers are encoded once at import and appended to the raw ASGI response start
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"content-security-policy", b"default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; font-src 'self' https://fonts.gstatic.com; img-src 'self' data: https://ui-avatars.com"),
+]
+
+class SecurityHeadersMiddleware:
+    """Pure ASGI middleware, so no Request/Response objects are built per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *SECURITY_HEADERS]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+app.add_middleware(SecurityHeadersMiddleware)
 
 app.include_router(auth_router)
 app.include_router(users_router.router)
@@ -71,7 +115,7 @@ app.include_router(users_router.router)
 @app.exception_handler(ValidationError)
 async def pydantic_validation_exception_handler(request: Request, exc: ValidationError):
     error_msg = exc.errors()[0]['msg']
-    return JSONResponse(
+    return DefaultJSONResponse(
         status_code=422,
         content={"detail": error_msg},
     )
@@ -79,19 +123,23 @@ async def pydantic_validation_exception_handler(request: Request, exc: Validatio
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 @app.get("/")
-async def read_index():
-    index_path = os.path.join(STATIC_DIR, "index.html")
-    if not os.path.exists(index_path):
+async def read_index(request: Request):
+    index_bytes = request.app.state.index_bytes
+    if index_bytes is None:
         return {"error": "index.html not found"}
-    return FileResponse(index_path)
+    etag = request.app.state.index_etag
+    headers = {"Cache-Control": "public, max-age=60", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=index_bytes, media_type="text/html", headers=headers)
 
 # --- PROTECTED CRUD Operations ---
 
 # CREATE: Automatically link the task to the current logged-in user
 @app.post("/tasks/", response_model=TaskRead)
-def create_task(
+async def create_task(
     task_input: TaskCreate, 
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     db_task = Task(
@@ -103,91 +151,122 @@ def create_task(
         owner_id=current_user.id  # Links task to the user
     )
     session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
-    return db_task
+    await session.commit()
+    return Response(content=dump_json(TASK_READ_ADAPTER, db_task), media_type="application/json")
 
 # STATISTICS: Get task statistics for current user
 @app.get("/tasks/stats")
-def get_task_stats(
-    session: Session = Depends(get_session),
+async def get_task_stats(
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     """Returns statistics about the user's tasks."""
-    statement = select(Task).where(Task.owner_id == current_user.id)
-    tasks = session.exec(statement).all()
+    # Let the database count tasks per (priority, completed) pair
+    statement = (
+        select(Task.priority, Task.is_completed, func.count())
+        .where(Task.owner_id == current_user.id)
+        .group_by(Task.priority, Task.is_completed)
+    )
+    rows = (await session.exec(statement)).all()
     
-    total = len(tasks)
-    completed = sum(1 for task in tasks if task.is_completed)
-    pending = total - completed
-    
-    # Count by priority
-    priority_counts = {
-        "urgent": sum(1 for task in tasks if task.priority == "urgent"),
-        "high": sum(1 for task in tasks if task.priority == "high"),
-        "medium": sum(1 for task in tasks if task.priority == "medium"),
-        "low": sum(1 for task in tasks if task.priority == "low")
-    }
+    total = 0
+    completed = 0
+    priority_counts = {"urgent": 0, "high": 0, "medium": 0, "low": 0}
+    for priority, is_completed, count in rows:
+        total += count
+        if is_completed:
+            completed += count
+        # str-mixin members hash and compare like their values, so no .value lookup is needed
+        priority_counts[priority] += count
     
     return {
         "total": total,
         "completed": completed,
-        "pending": pending,
+        "pending": total - completed,
         "by_priority": priority_counts
     }
 
 # READ: Fixed to fetch only tasks belonging to the current user
+# Rows are streamed from the cursor straight to JSON in batches, so memory
+# stays bounded by the batch size rather than the number of tasks
 @app.get("/tasks/", response_model=List[TaskRead])
-def read_tasks(
-    session: Session = Depends(get_session),
+async def read_tasks(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
+    # Cheap version check: count + latest update changes on every create/update/delete
+    version_statement = select(func.count(), func.max(Task.updated_at)).where(
+        Task.owner_id == current_user.id
+    )
+    count, latest = (await session.exec(version_statement)).one()
+    latest_stamp = int(latest.timestamp() * 1_000_000) if latest else 0
+    etag = f'W/"{current_user.id}-{count}-{latest_stamp}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
     # Filter tasks where owner_id matches current_user.id
-    statement = select(Task).where(Task.owner_id == current_user.id)
-    tasks = session.exec(statement).all()
-    return tasks
+    statement = (
+        select(Task)
+        .where(Task.owner_id == current_user.id)
+        .execution_options(yield_per=500)
+    )
+
+    async def stream_tasks():
+        # The streaming body outlives the request's dependencies, so it uses its own session
+        async with AsyncSession(engine) as session:
+            result = await session.stream_scalars(statement)
+            yield b"["
+            separator = b""
+            # Each batch is validated and encoded in one pydantic-core call; the
+            # surrounding brackets are stripped so batches join into one array
+            async for batch in result.partitions():
+                yield separator + dump_json(TASK_LIST_ADAPTER, batch)[1:-1]
+                separator = b","
+            yield b"]"
+
+    return StreamingResponse(stream_tasks(), media_type="application/json", headers={"ETag": etag})
 
 # DELETE: Fixed to ensure a user can only delete their own tasks
 @app.delete("/tasks/{task_id}")
-def delete_task(
+async def delete_task(
     task_id: int, 
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     # Search for the task by ID and ensure it belongs to the current user
     statement = select(Task).where(Task.id == task_id, Task.owner_id == current_user.id)
-    task = session.exec(statement).first()
+    task = (await session.exec(statement)).first()
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found or unauthorized access")
     
-    session.delete(task)
-    session.commit()
+    await session.delete(task)
+    await session.commit()
     return {"ok": True}
 
 # UPDATE: Fixed to ensure a user can only update their own tasks
 @app.patch("/tasks/{task_id}", response_model=TaskRead)
-def update_task(
+async def update_task(
     task_id: int, 
     task_data: TaskUpdate, 
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     # Ensure the task exists and belongs to the current user
     statement = select(Task).where(Task.id == task_id, Task.owner_id == current_user.id)
-    db_task = session.exec(statement).first()
+    db_task = (await session.exec(statement)).first()
     
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found or unauthorized access")
     
-    update_data = task_data.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_task, key, value)
+    # Copy only the fields the client sent, straight off the model (no model_dump dict)
+    for key in task_data.model_fields_set:
+        setattr(db_task, key, getattr(task_data, key))
     
     # Update the timestamp
     db_task.updated_at = datetime.utcnow()
     
     session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
-    return db_task
\ No newline at end of file
+    await session.commit()
+    return Response(content=dump_json(TASK_READ_ADAPTER, db_task), media_type="application/json")
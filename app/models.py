@@ -1,11 +1,12 @@
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, Index
 from typing import Optional, List
-from pydantic import field_validator, EmailStr
+from pydantic import EmailStr
 from datetime import datetime
 from enum import Enum
-import re
 
 # Enum for task priority levels
+# The str mixin gives pydantic-core its string-enum validator (the same path StrEnum
+# gets on 3.11+) while the database column keeps storing the member names
 class PriorityLevel(str, Enum):
     LOW = "low"
     MEDIUM = "medium"
@@ -20,6 +21,10 @@ class User(SQLModel, table=True):
     """
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(unique=True, index=True) 
+    # username.casefold(), set on insert: login and the uniqueness check use this
+    # key so they are case-insensitive for all of Unicode, while username keeps
+    # its original case for display. Nullable only so it can be added to old databases.
+    username_key: Optional[str] = Field(default=None, unique=True, index=True)
     email: EmailStr = Field(unique=True)
     hashed_password: str
     
@@ -41,6 +46,13 @@ class Task(SQLModel, table=True):
     Represents a task item.
     Each task must belong to a specific owner (User).
     """
+    # (owner_id, id) serves the per-user list/update/delete lookups;
+    # the second index lets /tasks/stats be answered from the index alone
+    __table_args__ = (
+        Index("ix_task_owner_id_id", "owner_id", "id"),
+        Index("ix_task_owner_priority_completed", "owner_id", "priority", "is_completed"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     description: Optional[str] = None
@@ -58,13 +70,3 @@ class Task(SQLModel, table=True):
 
     # Relationship: Allows accessing user info directly from a task object
     owner: Optional[User] = Relationship(back_populates="tasks")
-
-    @field_validator("title")
-    @classmethod
-    def validate_title(cls, value):
-        # Relaxed validator - allows more characters including punctuation
-        if not value or len(value.strip()) == 0:
-            raise ValueError("Title cannot be empty")
-        if len(value) > 200:
-            raise ValueError("Title must be less than 200 characters")
-        return value.strip()
\ No newline at end of file
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlmodel import Session, select
-from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Annotated, Optional
 import shutil
 import os
+import hashlib
+import time
+import tempfile
+import aiofiles
 from ..database import get_session
 from ..models import User
-from ..schemas import UserRead, UserUpdate
-from ..security import get_current_user
+from ..schemas import UserRead, UserUpdate, USER_READ_ADAPTER, dump_json
+from ..security import get_current_user, invalidate_cached_user
 
 router = APIRouter(
     prefix="/users",
@@ -15,60 +20,119 @@ router = APIRouter(
 
 # 1. Get Current User Profile
 @router.get("/me", response_model=UserRead)
-def read_user_me(current_user: User = Depends(get_current_user)):
+def read_user_me(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
     """
     Get the profile of the currently logged-in user.
+    Sends an ETag so clients can revalidate with If-None-Match and get a 304.
     """
-    return current_user
+    profile = tuple(getattr(current_user, field) for field in UserRead.model_fields)
+    etag = 'W/"' + hashlib.sha1(repr(profile).encode()).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(
+        content=dump_json(USER_READ_ADAPTER, current_user),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 # 2. Update User Profile
 @router.patch("/me", response_model=UserRead)
-def update_user_profile(
+async def update_user_profile(
     user_update: UserUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     """
     Update profile fields (full name, bio, job title, website) for the current user.
     """
-    user_data = user_update.model_dump(exclude_unset=True)
-    for key, value in user_data.items():
-        setattr(current_user, key, value)
+    for key in user_update.model_fields_set:
+        setattr(current_user, key, getattr(user_update, key))
         
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return current_user
+    await session.commit()
+    invalidate_cached_user(current_user.id)
+    return Response(content=dump_json(USER_READ_ADAPTER, current_user), media_type="application/json")
 
 # 3. Upload Profile Picture
+# Avatars are saved as files under /static/uploads and only their URL is kept in the database
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "uploads")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Uploads are copied to disk in chunks and rejected once they pass the size limit
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_AVATAR_SIZE = 5 * 1024 * 1024
+
+# File signatures used to check the actual image format instead of trusting content_type
+IMAGE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpg",
+}
+
+def detect_image_extension(header: bytes) -> Optional[str]:
+    """Returns the file extension matching the image signature, or None if unsupported."""
+    for signature, extension in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return extension
+    return None
+
 @router.post("/me/avatar", response_model=UserRead)
 async def upload_avatar(
     file: UploadFile = File(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Upload a profile picture. Images are converted to Base64 text and stored in the database.
+    Upload a profile picture. The image is saved to disk and its URL is stored on the user.
     """
     # Validate file type
     if file.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(status_code=400, detail="Only JPEG and PNG images are allowed.")
     
-    # Read the file content
-    contents = await file.read()
-    
-    # Convert to Base64
-    import base64
-    base64_encoded = base64.b64encode(contents).decode("utf-8")
-    
-    # Create Data URI (Text Format)
-    # Format: data:[<mediatype>][;base64],<data>
-    image_data_uri = f"data:{file.content_type};base64,{base64_encoded}"
+    # Check the real format from the first chunk before writing anything
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    extension = detect_image_extension(chunk)
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Only JPEG and PNG images are allowed.")
+
+    filename = f"user_{current_user.id}_avatar.{extension}"
+    final_path = os.path.join(UPLOAD_DIR, filename)
+    # Unique temp name, so concurrent uploads by the same user never share a file
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=f"{filename}.", suffix=".tmp")
+
+    # Stream the upload to the temp file so memory use stays at one chunk
+    size = 0
+    try:
+        async with aiofiles.open(fd, "wb") as out:
+            while chunk:
+                size += len(chunk)
+                if size > MAX_AVATAR_SIZE:
+                    raise HTTPException(status_code=413, detail="Image must be 5 MB or smaller.")
+                await out.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        # mkstemp creates the file as 0600; keep avatars readable like other static files
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, final_path)
+    except BaseException:
+        # Any failure (size limit, disk full, cancelled request) must not leave the temp file behind
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Remove an avatar saved earlier with a different extension
+    for old_extension in set(IMAGE_SIGNATURES.values()) - {extension}:
+        old_path = os.path.join(UPLOAD_DIR, f"user_{current_user.id}_avatar.{old_extension}")
+        if os.path.exists(old_path):
+            os.remove(old_path)
     
-    # Update user profile with the Base64 string
-    current_user.profile_image = image_data_uri
+    # Store the public URL; the version query makes browsers fetch the new image
+    current_user.profile_image = f"/static/uploads/{filename}?v={int(time.time())}"
     
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return current_user
+    await session.commit()
+    invalidate_cached_user(current_user.id)
+    return Response(content=dump_json(USER_READ_ADAPTER, current_user), media_type="application/json")
@@ -1,29 +1,55 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, field_validator, TypeAdapter
+from typing import List, Optional
 from datetime import datetime
-from enum import Enum
+import re
+from .models import PriorityLevel
 
-# Priority level enum matching the model
-class PriorityLevel(str, Enum):
-    LOW = "low"
-    MEDIUM = "medium"
-    HIGH = "high"
-    URGENT = "urgent"
+# Fast-path regex: at least 8 characters, one ASCII digit and one ASCII letter.
+# It is deliberately narrower than the isdigit()/isalpha() rules in the validator,
+# so anything it accepts the full rules accept too; other passwords fall through.
+_PASSWORD_MIN_LENGTH = 8
+_PASSWORD_RE = re.compile(rf"(?=.*[0-9])(?=.*[A-Za-z]).{{{_PASSWORD_MIN_LENGTH},}}", re.DOTALL)
+# Bound once so the validator does a single lookup instead of a global + attribute fetch
+_password_fullmatch = _PASSWORD_RE.fullmatch
+
+def _validate_title(value: str) -> str:
+    """Strips a task title and checks it is not empty and at most 200 characters."""
+    # Relaxed validator - allows more characters including punctuation
+    value = value.strip() if value else ""
+    length = len(value)
+    if not length:
+        raise ValueError("Title cannot be empty")
+    if length > 200:
+        raise ValueError("Title must be less than 200 characters")
+    return value
 
 # --- TASK SCHEMAS ---
+# All schemas use defer_build=True: validators are built on first use (or by
+# build_schemas() at startup) instead of when this module is imported.
 
 # This schema is used when creating a new task. 
 # User doesn't send owner_id; the backend gets it from the JWT token.
 class TaskCreate(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     title: str
     description: Optional[str] = None
     priority: Optional[PriorityLevel] = PriorityLevel.MEDIUM
     due_date: Optional[datetime] = None
     category: Optional[str] = None
 
+    # Titles are checked here: the Task table model skips validation on construction
+    @field_validator("title")
+    @staticmethod
+    def validate_title(value):
+        return _validate_title(value)
+
 # This schema is used for returning data to the user.
 # It now includes 'owner_id' to show who the task belongs to.
 class TaskRead(BaseModel):
+    # Read fields straight off the ORM object instead of converting it to a dict first
+    model_config = ConfigDict(from_attributes=True, extra="ignore", defer_build=True)
+
     id: int
     title: str
     description: Optional[str] = None
@@ -38,6 +64,9 @@ class TaskRead(BaseModel):
 # This schema is used for updating existing tasks.
 # All fields are optional to allow partial updates (PATCH).
 class TaskUpdate(BaseModel):
+    # Reject unknown keys up front
+    model_config = ConfigDict(extra="forbid", defer_build=True)
+
     title: Optional[str] = None
     description: Optional[str] = None
     is_completed: Optional[bool] = None
@@ -45,13 +74,19 @@ class TaskUpdate(BaseModel):
     due_date: Optional[datetime] = None
     category: Optional[str] = None
 
+    @field_validator("title")
+    @staticmethod
+    def validate_title(value):
+        return _validate_title(value)
+
 
 # --- USER SCHEMAS ---
 
 # This schema is used for returning user information.
 # We never include the password/hashed_password here for security.
-# This schema is used for returning user information.
 class UserRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore", defer_build=True)
+
     id: int
     username: str
     email: EmailStr
@@ -63,6 +98,8 @@ class UserRead(BaseModel):
 
 # This is used for updating user profile information.
 class UserUpdate(BaseModel):
+    model_config = ConfigDict(extra="forbid", defer_build=True)
+
     full_name: Optional[str] = None
     job_title: Optional[str] = None
     bio: Optional[str] = None
@@ -70,16 +107,46 @@ class UserUpdate(BaseModel):
 
 # This is used for receiving user data during registration.
 class UserCreate(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     username: str
     email: EmailStr
     password: str 
 
+    # Static: the check never uses the class, so pydantic calls a plain function.
+    # (Field(pattern=...) can't replace it: pydantic-core's regex has no lookaheads.)
     @field_validator("password")
-    def validate_password(cls, v):
-        if len(v) < 8:
+    @staticmethod
+    def validate_password(v):
+        # Fast path: a single regex pass accepts valid passwords
+        if _password_fullmatch(v):
+            return v
+        # Invalid password: find the failing rule for the error message
+        if len(v) < _PASSWORD_MIN_LENGTH:
             raise ValueError("Password must be at least 8 characters long")
         if not any(char.isdigit() for char in v):
             raise ValueError("Password must contain at least one number")
         if not any(char.isalpha() for char in v):
             raise ValueError("Password must contain at least one letter")
-        return v
\ No newline at end of file
+        return v
+
+
+# --- TYPE ADAPTERS ---
+
+# Created once at import so routes can validate an ORM object and write JSON bytes
+# in one pydantic-core call, instead of FastAPI's dict + re-encode pass.
+# Like the schemas, they are deferred and built by build_schemas().
+TASK_READ_ADAPTER = TypeAdapter(TaskRead)
+USER_READ_ADAPTER = TypeAdapter(UserRead)
+TASK_LIST_ADAPTER = TypeAdapter(List[TaskRead], config=ConfigDict(defer_build=True))
+
+def dump_json(adapter: TypeAdapter, obj) -> bytes:
+    """Validates an ORM object against the adapter's schema and returns it as JSON bytes."""
+    return adapter.dump_json(adapter.validate_python(obj, from_attributes=True))
+
+def build_schemas() -> None:
+    """Builds the deferred schema validators and adapters up front, e.g. during app startup."""
+    for model in (TaskCreate, TaskRead, TaskUpdate, UserRead, UserUpdate, UserCreate):
+        model.model_rebuild()
+    for adapter in (TASK_READ_ADAPTER, USER_READ_ADAPTER, TASK_LIST_ADAPTER):
+        adapter.rebuild()
@@ -1,16 +1,30 @@
 import os
-from datetime import datetime, timedelta
+import time
+import asyncio
+import hashlib
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from dataclasses import dataclass
+import jwt
+from jwt import InvalidTokenError as JWTError
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHash, VerificationError
+from cachetools import TTLCache
+from sqlalchemy.orm import make_transient_to_detached
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
 from pathlib import Path
 
 # Load environment variables from .env file
-# Use explicit path to ensure .env is found regardless of import context
+# Use explicit path to ensure .env is found regardless of import context.
+# Variables already set in the environment take precedence over the file.
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
@@ -19,21 +33,96 @@ from .database import get_session
 from .models import User
 
 # --- CONFIGURATION ---
-# Load from environment variables (NEVER hardcode secrets!)
-# Load from environment variables
-SECRET_KEY = os.getenv("SECRET_KEY")
+@dataclass(frozen=True)
+class Settings:
+    """Token settings, read from the environment once at import."""
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
 
-# Fallback if not set (Prevents crash on deployment, but logs warning)
-if not SECRET_KEY:
-    import secrets
-    print("WARNING: SECRET_KEY not found in env. Using temporary generated key.")
-    SECRET_KEY = secrets.token_hex(32)
+def _load_settings() -> Settings:
+    # Load from environment variables (NEVER hardcode secrets!)
+    secret_key = os.getenv("SECRET_KEY")
 
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    # Fallback if not set (Prevents crash on deployment, but logs warning)
+    if not secret_key:
+        import secrets
+        print("WARNING: SECRET_KEY not found in env. Using temporary generated key.")
+        secret_key = secrets.token_hex(32)
+
+    return Settings(
+        secret_key=secret_key,
+        algorithm="EdDSA",
+        access_token_expire_minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")),
+    )
+
+settings = _load_settings()
+
+# JWT 'exp' is plain seconds since the epoch, so keep the default lifetime in seconds too
+_DEFAULT_TOKEN_TTL = settings.access_token_expire_minutes * 60
+
+# Tokens are signed with Ed25519. The keypair comes from JWT_PRIVATE_KEY /
+# JWT_PUBLIC_KEY (PEM); without them the private key is derived from SECRET_KEY
+# so every worker still signs with the same key. Keys are parsed once here.
+def _load_pem(name: str) -> Optional[bytes]:
+    value = os.getenv(name)
+    # Allow PEMs stored on one line with escaped newlines
+    return value.replace("\\n", "\n").encode() if value else None
+
+_private_pem = _load_pem("JWT_PRIVATE_KEY")
+if _private_pem:
+    _PRIVATE_KEY = serialization.load_pem_private_key(_private_pem, password=None)
+else:
+    _PRIVATE_KEY = Ed25519PrivateKey.from_private_bytes(hashlib.sha256(settings.secret_key.encode()).digest())
+
+_public_pem = _load_pem("JWT_PUBLIC_KEY")
+_PUBLIC_KEY = serialization.load_pem_public_key(_public_pem) if _public_pem else _PRIVATE_KEY.public_key()
+
+# Decode arguments built once instead of per request
+_JWT_ALGORITHMS = [settings.algorithm]
+_JWT_DECODE_OPTIONS = {"require": ["exp", "sub"]}
 
 # Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# New hashes use Argon2id; existing bcrypt hashes still verify and are
+# re-hashed to Argon2id on the next successful login.
+# Defaults follow the OWASP baseline (19 MiB, 2 iterations, 1 lane).
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+# argon2-cffi and bcrypt are called directly: a generic scheme registry would
+# add its lookup and policy checks around every native hash call
+_argon2_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+# Optional server-side pepper: passwords are HMAC-SHA256'd with it before Argon2,
+# so a leaked database alone is not enough to brute-force hashes. Peppered hashes
+# carry a marker so hashes made before the pepper was set still verify and are
+# upgraded on the next login. Changing the pepper invalidates peppered hashes.
+_PEPPER = os.getenv("PASSWORD_PEPPER", "").encode()
+_PEPPER_MARKER = "$pepper"
+# Keyed once here; each call copies the prepared state instead of re-deriving the key pads
+_PEPPER_HMAC = hmac.new(_PEPPER, digestmod=hashlib.sha256)
+
+def _apply_pepper(password: str) -> str:
+    mac = _PEPPER_HMAC.copy()
+    mac.update(password.encode())
+    return mac.hexdigest()
+
+# Hashing is CPU-bound and the C implementations release the GIL, so async
+# routes run it on this pool instead of blocking the event loop
+_hash_pool = ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 1), thread_name_prefix="password-hash")
+
+# Verified tokens -> (user id, expiry), so repeat requests skip JWT verification
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# User id -> column values, so a cached token can skip the user SELECT.
+# Plain dicts are cached (not ORM objects) because each request needs its own instance.
+_user_cache = TTLCache(maxsize=50_000, ttl=30)
 
 # OAuth2 scheme: This points to the login URL to get the token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
@@ -41,32 +130,80 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 # --- PASSWORD FUNCTIONS ---
 
 def hash_password(password: str) -> str:
-    """Hashes a plain text password using bcrypt."""
-    return pwd_context.hash(password)
+    """Hashes a plain text password using Argon2id (peppered when PASSWORD_PEPPER is set)."""
+    if _PEPPER:
+        return _PEPPER_MARKER + _argon2_hasher.hash(_apply_pepper(password))
+    return _argon2_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Checks if the provided password matches the stored hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Checks if the provided password matches the stored Argon2 or legacy bcrypt hash."""
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    if hashed_password.startswith(_PEPPER_MARKER):
+        if not _PEPPER:
+            return False
+        hashed_password = hashed_password[len(_PEPPER_MARKER):]
+        plain_password = _apply_pepper(plain_password)
+    try:
+        return _argon2_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHash):
+        return False
+
+async def ahash_password(password: str) -> str:
+    """Async version of hash_password that runs on the hashing thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, hash_password, password)
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Async version of verify_password that runs on the hashing thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_pool, verify_password, plain_password, hashed_password
+    )
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Checks if a stored hash uses bcrypt, outdated Argon2 parameters or no pepper."""
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return True
+    if hashed_password.startswith(_PEPPER_MARKER):
+        hashed_password = hashed_password[len(_PEPPER_MARKER):]
+    elif _PEPPER:
+        return True
+    try:
+        return _argon2_hasher.check_needs_rehash(hashed_password)
+    except InvalidHash:
+        return True
 
 # --- JWT TOKEN FUNCTIONS ---
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Generates a secure JWT access token."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    ttl = int(expires_delta.total_seconds()) if expires_delta else _DEFAULT_TOKEN_TTL
+    to_encode["exp"] = int(time.time()) + ttl
+    encoded_jwt = jwt.encode(to_encode, _PRIVATE_KEY, algorithm=settings.algorithm)
     return encoded_jwt
 
+# --- USER CACHE ---
+
+def _attach_cached_user(session: AsyncSession, user_id: int) -> Optional[User]:
+    """Rebuilds a cached user and attaches it to the session without querying the database."""
+    data = _user_cache.get(user_id)
+    if data is None:
+        return None
+    user = User(**data)
+    # Mark it as an existing row so later changes are saved as an UPDATE
+    make_transient_to_detached(user)
+    session.add(user)
+    return user
+
+def invalidate_cached_user(user_id: int) -> None:
+    """Drops a user from the cache; call after changing any of their columns."""
+    _user_cache.pop(user_id, None)
+
 # --- DEPENDENCY: GET CURRENT USER ---
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme), 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ) -> User:
     """
     Decodes the JWT token, validates it, and returns the user from the database.
@@ -78,22 +215,36 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # Fast path: token was already verified recently and has not expired
+    cached = _token_cache.get(token)
+    if cached:
+        if cached[1] > time.time():
+            user = _attach_cached_user(session, cached[0])
+            if user is None:
+                user = await session.get(User, cached[0])
+                if user is not None:
+                    _user_cache[user.id] = user.model_dump()
+            if user is not None:
+                return user
+        # Expired token or deleted user: drop the entry and fall through to full validation
+        _token_cache.pop(token, None)
+
     try:
         # Decode the JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub") # 'sub' is a standard for subject (username)
-        
-        if username is None:
-            raise credentials_exception
-            
-    except JWTError:
+        # Missing 'exp' or 'sub' claims raise inside jwt.decode (see _JWT_DECODE_OPTIONS)
+        payload = jwt.decode(token, _PUBLIC_KEY, algorithms=_JWT_ALGORITHMS, options=_JWT_DECODE_OPTIONS)
+        user_id = int(payload["sub"]) # 'sub' is a standard for subject (user id)
+    except (JWTError, ValueError):
+        # ValueError: tokens issued before 'sub' carried the user id
         raise credentials_exception
         
-    # Fetch the user from the database
-    statement = select(User).where(User.username == username)
-    user = session.exec(statement).first()
+    # Primary-key lookup; served from the identity map when the session already holds the user
+    user = await session.get(User, user_id)
     
     if user is None:
         raise credentials_exception
+
+    _token_cache[token] = (user.id, payload["exp"])
+    _user_cache[user.id] = user.model_dump()
         
     return user
\ No newline at end of file
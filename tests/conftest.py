@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# app.database reads DATABASE_URL at import, so point it at a scratch file first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
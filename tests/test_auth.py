@@ -0,0 +1,44 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth
+from app.main import app
+
+
+@pytest.fixture
+def client():
+    # Registration is rate limited to 3/minute per client
+    auth.limiter.enabled = False
+    with TestClient(app) as test_client:
+        yield test_client
+    auth.limiter.enabled = True
+
+
+def register(client, username, email):
+    return client.post(
+        "/auth/register/", json={"username": username, "email": email, "password": "abc12345"}
+    )
+
+
+def login(client, username):
+    return client.post("/auth/token", data={"username": username, "password": "abc12345"})
+
+
+def test_non_ascii_username_is_case_insensitive(client):
+    response = register(client, "Émile", "emile@example.com")
+    assert response.status_code == 200
+    assert response.json()["username"] == "Émile"
+
+    # NOCASE would only fold ASCII; casefold() also folds É/é
+    duplicate = register(client, "émile", "emile2@example.com")
+    assert duplicate.status_code == 400
+    assert "username" in duplicate.json()["detail"]
+
+    for typed in ("Émile", "émile", "ÉMILE"):
+        assert login(client, typed).status_code == 200
+
+
+def test_login_folds_beyond_lowercase(client):
+    assert register(client, "Straße", "strasse@example.com").status_code == 200
+    assert login(client, "STRASSE").status_code == 200
+    assert login(client, "strasse").status_code == 200
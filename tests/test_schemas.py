@@ -0,0 +1,46 @@
+import pytest
+from pydantic import ValidationError
+
+from app.schemas import TaskCreate, TaskUpdate, UserCreate
+
+
+def make_user(password: str) -> UserCreate:
+    return UserCreate(username="tester", email="tester@example.com", password=password)
+
+
+@pytest.mark.parametrize("password", ["abc12345", "pässwörd1", "пароль123", "abc 1234\n"])
+def test_password_accepted(password):
+    assert make_user(password).password == password
+
+
+@pytest.mark.parametrize(
+    "password, message",
+    [
+        ("abc1", "at least 8 characters"),
+        ("abcdefgh", "at least one number"),
+        ("12345678", "at least one letter"),
+        # Numeric characters that are not letters must not satisfy the letter rule
+        ("12345678½", "at least one letter"),
+        ("12345678²", "at least one letter"),
+        ("1234567Ⅻ", "at least one letter"),
+    ],
+)
+def test_password_rejected(password, message):
+    with pytest.raises(ValidationError, match=message):
+        make_user(password)
+
+
+@pytest.mark.parametrize("schema", [TaskCreate, TaskUpdate])
+def test_task_title_is_stripped(schema):
+    assert schema(title="  hi  ").title == "hi"
+
+
+@pytest.mark.parametrize("schema", [TaskCreate, TaskUpdate])
+@pytest.mark.parametrize("title, message", [("   ", "cannot be empty"), ("x" * 201, "less than 200")])
+def test_task_title_rejected(schema, title, message):
+    with pytest.raises(ValidationError, match=message):
+        schema(title=title)
+
+
+def test_task_update_without_title():
+    assert "title" not in TaskUpdate(is_completed=True).model_fields_set
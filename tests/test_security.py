@@ -0,0 +1,74 @@
+import hashlib
+import hmac
+
+import bcrypt
+import pytest
+from argon2 import PasswordHasher
+
+from app import security
+from app.security import hash_password, password_needs_rehash, verify_password
+
+PASSWORD = "abc12345"
+
+
+def set_pepper(monkeypatch, pepper: str):
+    monkeypatch.setattr(security, "_PEPPER", pepper.encode())
+    monkeypatch.setattr(security, "_PEPPER_HMAC", hmac.new(pepper.encode(), digestmod=hashlib.sha256))
+
+
+@pytest.fixture(autouse=True)
+def no_pepper(monkeypatch):
+    set_pepper(monkeypatch, "")
+
+
+def test_argon2_hash_round_trip():
+    hashed = hash_password(PASSWORD)
+    assert hashed.startswith("$argon2id$")
+    assert verify_password(PASSWORD, hashed)
+    assert not verify_password("wrong-password1", hashed)
+    assert not password_needs_rehash(hashed)
+
+
+def test_legacy_bcrypt_hash_verifies_and_needs_rehash():
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=4)).decode()
+    assert verify_password(PASSWORD, hashed)
+    assert not verify_password("wrong-password1", hashed)
+    assert password_needs_rehash(hashed)
+
+
+def test_outdated_argon2_parameters_need_rehash():
+    hashed = PasswordHasher(time_cost=1, memory_cost=8192, parallelism=1).hash(PASSWORD)
+    assert verify_password(PASSWORD, hashed)
+    assert password_needs_rehash(hashed)
+
+
+def test_unpeppered_hash_verifies_and_needs_rehash_once_pepper_is_set(monkeypatch):
+    hashed = hash_password(PASSWORD)
+    set_pepper(monkeypatch, "pepper")
+    assert verify_password(PASSWORD, hashed)
+    assert password_needs_rehash(hashed)
+
+
+def test_peppered_hash_round_trip(monkeypatch):
+    set_pepper(monkeypatch, "pepper")
+    hashed = hash_password(PASSWORD)
+    assert hashed.startswith("$pepper$argon2id$")
+    assert verify_password(PASSWORD, hashed)
+    assert not verify_password("wrong-password1", hashed)
+    assert not password_needs_rehash(hashed)
+
+
+def test_peppered_hash_fails_without_or_with_another_pepper(monkeypatch):
+    set_pepper(monkeypatch, "pepper")
+    hashed = hash_password(PASSWORD)
+
+    set_pepper(monkeypatch, "")
+    assert not verify_password(PASSWORD, hashed)
+
+    set_pepper(monkeypatch, "other-pepper")
+    assert not verify_password(PASSWORD, hashed)
+
+
+def test_malformed_hash_is_rejected():
+    assert not verify_password(PASSWORD, "not-a-hash")
+    assert password_needs_rehash("not-a-hash")